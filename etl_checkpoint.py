@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""
+File-granular checkpoints and dead-letter handling for the ISO 20022 ETL.
+
+Every successfully processed file appends one record to an append-only JSONL
+journal: the stage, the file, its size/mtime and the delta it contributed
+(new party registrations, purpose codes, fact rows or status events). A rerun
+replays the journal instead of re-parsing those files and continues with the
+remaining ones. The journal is removed once a run completes. Deltas of later
+stages are matched against the payments of earlier ones, so they are discarded
+when a resumed run processes files of an earlier stage again.
+
+Files that fail are copied to <dead_letter_dir>/<stage>/ next to a
+<file>.error.json describing the error, and the run carries on. A resumed run
+skips them unless they were changed (fixed) since they failed.
+"""
+
+import os
+import json
+import shutil
+import traceback
+from datetime import datetime, timezone
+
+# ========================
+# CONFIG
+# ========================
+# Format of the journal records and of the ETL deltas they hold; bump it when
+# either changes so journals of an older build are discarded instead of replayed.
+JOURNAL_VERSION = 3
+
+# ========================
+# HELPERS
+# ========================
+def file_signature(path, st=None):
+    st = st or os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+def dead_letter(dead_letter_dir, stage, file, exc):
+    """Copy a failing file to the dead-letter folder and record the error next to it."""
+    stage_dir = os.path.join(dead_letter_dir, stage)
+    os.makedirs(stage_dir, exist_ok=True)
+    target = os.path.join(stage_dir, os.path.basename(file))
+    try:
+        shutil.copy2(file, target)
+    except OSError:
+        pass  # unreadable source: the error report is still written
+
+    with open(target + '.error.json', 'w', encoding='utf-8') as f:
+        json.dump({
+            'Stage': stage,
+            'SourceFile': file,
+            'ErrorType': type(exc).__name__,
+            'Error': str(exc),
+            'Traceback': ''.join(traceback.format_exception(type(exc), exc, exc.__traceback__)),
+            'FailedAt': datetime.now(timezone.utc).replace(microsecond=0).isoformat(),
+        }, f, indent=2, ensure_ascii=False)
+    return target
+
+# ========================
+# CHECKPOINT JOURNAL
+# ========================
+class Checkpoint:
+    """Append-only journal of processed files and the state delta of each."""
+
+    def __init__(self, directory, fresh=False):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, 'journal.jsonl')
+        self.records = {}   # stage -> [record, ...] in commit order
+        self.done = set()   # (stage, file)
+        self.failed = {}    # (stage, file) -> failed record
+
+        if fresh and os.path.exists(self.path):
+            os.remove(self.path)
+        self._load()
+        self._fh = open(self.path, 'a', encoding='utf-8')
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+
+        valid_bytes = 0
+        records = []
+        with open(self.path, 'rb') as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    break  # torn write from an interrupted run
+                valid_bytes += len(line)
+
+        if any(rec.get('Version') != JOURNAL_VERSION for rec in records):
+            print("Checkpoint discarded: written by a different ETL version")
+            os.remove(self.path)
+            return
+
+        # Completed files that changed since their checkpoint invalidate the journal
+        for rec in records:
+            if rec['Status'] != 'done':
+                continue
+            if not os.path.exists(rec['File']) or file_signature(rec['File']) != rec['Signature']:
+                print(f"Checkpoint discarded: {rec['File']} changed since it was processed")
+                os.remove(self.path)
+                return
+
+        with open(self.path, 'r+b') as f:
+            f.truncate(valid_bytes)
+
+        for rec in records:
+            key = (rec['Stage'], rec['File'])
+            if rec['Status'] == 'done':
+                self.records.setdefault(rec['Stage'], []).append(rec)
+                self.done.add(key)
+            else:
+                self.failed[key] = rec
+
+    @property
+    def resumed(self):
+        return len(self.done) + len(self.failed)
+
+    def is_done(self, stage, file):
+        """
+        True if file was processed, or dead-lettered, earlier in this run.
+        A dead-lettered file that has changed since it failed is pending again.
+        """
+        if (stage, file) in self.done:
+            return True
+        failed = self.failed.get((stage, file))
+        return (failed is not None and os.path.exists(file)
+                and file_signature(file) == failed['Signature'])
+
+    def replay(self, stage):
+        """Deltas of the files already processed for stage, in commit order."""
+        return [rec['Delta'] for rec in self.records.get(stage, [])]
+
+    def _append(self, record):
+        record = dict(record, Version=JOURNAL_VERSION)
+        self._fh.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self._fh.flush()
+        os.fsync(self._fh.fileno())
+
+    def discard(self, stages):
+        """Forget the processed and failed files of stages; returns how many were dropped."""
+        dropped = [key for key in self.done | set(self.failed) if key[0] in stages]
+        if not dropped:
+            return 0
+        for stage in stages:
+            self.records.pop(stage, None)
+        self.done.difference_update(dropped)
+        for key in dropped:
+            self.failed.pop(key, None)
+
+        # Rewrite the journal without those records, atomically
+        self._fh.close()
+        tmp_path = self.path + '.tmp'
+        with open(self.path, 'r', encoding='utf-8') as src, open(tmp_path, 'w', encoding='utf-8') as dst:
+            for line in src:
+                if json.loads(line)['Stage'] not in stages:
+                    dst.write(line)
+            dst.flush()
+            os.fsync(dst.fileno())
+        os.replace(tmp_path, self.path)
+        self._fh = open(self.path, 'a', encoding='utf-8')
+        return len(dropped)
+
+    def commit(self, stage, file, delta, st=None):
+        """st: os.stat_result of the file as it was read, if the caller has one."""
+        self._append({'Stage': stage, 'File': file, 'Status': 'done',
+                      'Signature': file_signature(file, st), 'Delta': delta})
+        self.done.add((stage, file))
+        self.failed.pop((stage, file), None)
+
+    def record_failure(self, stage, file, exc, st=None):
+        try:
+            signature = file_signature(file, st)
+        except OSError:
+            signature = None  # unreadable file: retried on resume
+        record = {'Stage': stage, 'File': file, 'Status': 'failed',
+                  'Signature': signature, 'Error': f"{type(exc).__name__}: {exc}"}
+        self._append(record)
+        self.failed[(stage, file)] = record
+
+    def finish(self):
+        """Close and remove the journal after a completed run."""
+        self._fh.close()
+        os.remove(self.path)
@@ -1,15 +1,24 @@
 import os
+import sys
 import glob
+import time
 import csv
 import xml.etree.ElementTree as ET
-from datetime import datetime
+from datetime import datetime, timezone
+from itertools import islice
 import pandas as pd
+from lifecycle_index import LifecycleIndex, STAGES, STAGE_ELEMENTS, element_offsets
+from party_resolution import resolve_parties, load_crosswalk, write_crosswalk
+from etl_checkpoint import Checkpoint, dead_letter
+from data_quality import DataQuality, control_totals, status_amount
+from xml_reader import ReadAhead, ReadStats
 
 # ========================
 # CONFIG
 # ========================
 BASE_DIR = 'data'
 OUTPUT_DIR = 'output'
+DEAD_LETTER_DIR = os.path.join(OUTPUT_DIR, 'dead_letter')
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
 pain001_dir = os.path.join(BASE_DIR, 'ISO20022_pain001')
@@ -17,9 +26,24 @@ pacs008_dir = os.path.join(BASE_DIR, 'ISO20022_pacs008')
 pacs002_dir = os.path.join(BASE_DIR, 'ISO20022_pacs002')
 camt054_dir = os.path.join(BASE_DIR, 'ISO20022_camt054')
 
+# EndToEndId lifecycle index (see lifecycle_index.py for the lookup CLI)
+lifecycle_index = LifecycleIndex(os.path.join(OUTPUT_DIR, 'lifecycle_index.sqlite'))
+
 # ========================
 # HELPERS
 # ========================
+def index_lifecycle_events(file, stage, raw, st, events):
+    """
+    Store (end_to_end_id, fields) events of one file in the lifecycle index,
+    pairing each with the byte offset of its transaction element.
+    """
+    offsets = element_offsets(raw, STAGE_ELEMENTS[stage])
+    if len(offsets) != len(events):
+        offsets = [None] * len(events)
+    lifecycle_index.replace_file(
+        file, stage, [(e2e, offset, fields) for (e2e, fields), offset in zip(events, offsets)], st
+    )
+
 def parse_datetime(dt_str):
     """Parse ISO datetime with or without timezone Z."""
     if not dt_str:
@@ -29,6 +53,14 @@ def parse_datetime(dt_str):
     except Exception:
         return None
 
+def minutes_between(start_iso, end):
+    """Minutes from an ISO start to a datetime end; naive values are taken as UTC."""
+    if not start_iso or end is None:
+        return None
+    start = datetime.fromisoformat(start_iso)
+    start, end = (dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt for dt in (start, end))
+    return round((end - start).total_seconds() / 60, 2)
+
 def extract_amount_currency(tx, ns):
     """Robust amount & currency extraction."""
     el = tx.find('.//ns:IntrBkSttlmAmt', ns)
@@ -120,12 +152,118 @@ def get_or_create_creditor(name, iban, country):
         creditor_counter += 1
     return creditors[key]['PartyID']
 
-print("Extracting parties and purpose codes from pain.001 ...")
+def _registry_tail(registry, start):
+    """Registrations added after the registry held `start` entries (insertion order)."""
+    added = list(islice(reversed(registry.values()), len(registry) - start))
+    added.reverse()
+    return added
+
+def new_parties_since(n_debtors, n_creditors):
+    return {'Debtor': _registry_tail(debtors, n_debtors),
+            'Creditor': _registry_tail(creditors, n_creditors)}
+
+def rollback_parties(n_debtors, n_creditors):
+    """Drop registrations made by a file that failed halfway."""
+    global debtor_counter, creditor_counter
+    while len(debtors) > n_debtors:
+        debtors.popitem()
+    while len(creditors) > n_creditors:
+        creditors.popitem()
+    debtor_counter = len(debtors) + 1
+    creditor_counter = len(creditors) + 1
+
+def restore_parties(parties):
+    """Re-register checkpointed parties; no-op for parties already registered."""
+    global debtor_counter, creditor_counter
+    for party in parties['Debtor']:
+        debtors.setdefault((party['Name'] or '', party['IBAN'] or ''), party)
+    for party in parties['Creditor']:
+        creditors.setdefault((party['Name'] or '', party['IBAN'] or ''), party)
+    debtor_counter = len(debtors) + 1
+    creditor_counter = len(creditors) + 1
+
+# ========================
+# CHECKPOINTED STAGES
+# ========================
+checkpoint = Checkpoint(os.path.join(OUTPUT_DIR, 'checkpoint'), fresh='--fresh' in sys.argv[1:])
+if checkpoint.resumed:
+    print(f"Resuming from checkpoint: {checkpoint.resumed} files already handled")
+
+# Data-quality checks accumulated during the parse pass
+dq = DataQuality()
+
+def check_control_totals(stage, file, root, ns, tx_tag, amount_of):
+    """NbOfTxs/CtrlSum checks of the GrpHdr and of every PmtInf block that declares them."""
+    msg_id = root.findtext('.//ns:GrpHdr/ns:MsgId', namespaces=ns)
+    results = []
+    for block in [root.find('.//ns:GrpHdr', ns)] + root.findall('.//ns:PmtInf', ns):
+        if block is None:
+            continue
+        scope = root if block.tag.endswith('GrpHdr') else block
+        amounts = [amount_of(tx) for tx in scope.findall(f'.//ns:{tx_tag}', ns)]
+        results += control_totals(stage, file, msg_id,
+                                  block.findtext('ns:NbOfTxs', namespaces=ns),
+                                  block.findtext('ns:CtrlSum', namespaces=ns), amounts)
+    return results
+
+def run_stage(stage, folder, process_file, apply_delta):
+    """
+    Replay the checkpointed files of a stage, then process the remaining ones.
+    File bytes are read ahead on a thread pool and parsed from memory;
+    process_file(file, raw, root, index_events) returns the file's delta and
+    apply_delta merges it into the ETL state. index_events is a list to append
+    the file's lifecycle events to, or None when the index is already current;
+    they are written once the whole file has been processed. A failing file is
+    rolled back and sent to the dead-letter folder.
+    """
+    for delta in checkpoint.replay(stage):
+        apply_delta(delta)
+
+    pending = [file for file in glob.glob(os.path.join(folder, '*.xml'))
+               if not checkpoint.is_done(stage, file)]
+    if pending:
+        # New, changed or retried files here change what later stages match against
+        dropped = checkpoint.discard(STAGES[STAGES.index(stage) + 1:])
+        if dropped:
+            print(f"[{stage}] {len(pending)} file(s) to process: "
+                  f"{dropped} checkpointed file(s) of later stages will be processed again")
+    stats = ReadStats()
+
+    for file, fetch in ReadAhead(pending, stats=stats):
+        mark = (len(debtors), len(creditors))
+        st = start = parsed = None
+        try:
+            # st is the fstat() taken by the reader: no stat() on this thread
+            raw, st = fetch()
+            start = time.perf_counter()
+            root = ET.fromstring(raw)
+            parsed = time.perf_counter()
+            index_events = None if lifecycle_index.is_current(file, st) else []
+            delta = process_file(file, raw, root, index_events)
+            if index_events is not None:
+                index_lifecycle_events(file, stage, raw, st, index_events)
+            stats.add_times(start, parsed, time.perf_counter())
+        except Exception as exc:
+            stats.add_times(start, parsed, time.perf_counter())
+            rollback_parties(*mark)
+            dead_letter(DEAD_LETTER_DIR, stage, file, exc)
+            checkpoint.record_failure(stage, file, exc, st)
+            print(f"[{stage}] {file} sent to dead letter: {exc}")
+            continue
+        delta['File'] = file
+        delta['Parties'] = new_parties_since(*mark)
+        apply_delta(delta)
+        checkpoint.commit(stage, file, delta, st)
 
-for file in glob.glob(os.path.join(pain001_dir, '*.xml')):
-    tree = ET.parse(file)
-    root = tree.getroot()
+    if pending:
+        print(f"[{stage}] {stats.summary()}")
+
+def process_pain001_file(file, raw, root, index_events):
+    """Register parties and collect PurposeCodes of one pain.001 file."""
     ns = {'ns': root.tag.split('}')[0].strip('{')}
+    purposes = {}
+    end_to_end_ids = []
+    tx_amounts = {}
 
     # Debtor (message level)
     dbtr_name = root.find('.//ns:Dbtr/ns:Nm', ns)
@@ -137,6 +275,8 @@ for file in glob.glob(os.path.join(pain001_dir, '*.xml')):
         dbtr_country.text if dbtr_country is not None else None
     )
 
+    pain_msg_id = root.findtext('.//ns:GrpHdr/ns:MsgId', namespaces=ns)
+
     # Creditors per transaction + PurposeCode lookup
     for cdt in root.findall('.//ns:CdtTrfTxInf', ns):
         cdtr_name = cdt.find('.//ns:Cdtr/ns:Nm', ns)
@@ -149,23 +289,38 @@ for file in glob.glob(os.path.join(pain001_dir, '*.xml')):
         )
 
         end_to_end = cdt.findtext('.//ns:PmtId/ns:EndToEndId', namespaces=ns)
+        end_to_end_ids.append(end_to_end)
         purpose_cd = cdt.findtext('.//ns:Purp/ns:Cd', namespaces=ns)
         if end_to_end and purpose_cd:
-            purpose_lookup[(end_to_end or '').strip().upper()] = purpose_cd.strip()
+            purposes[(end_to_end or '').strip().upper()] = purpose_cd.strip()
+
+        amount, currency = extract_amount_currency(cdt, ns)
+        tx_amounts[cdt] = amount
+
+        if index_events is not None:
+            index_events.append((end_to_end, {
+                'MsgId': pain_msg_id,
+                'InstrId': cdt.findtext('.//ns:PmtId/ns:InstrId', namespaces=ns),
+                'Amount': amount,
+                'CurrencyCode': currency,
+                'CreditorName': cdtr_name.text if cdtr_name is not None else None,
+                'PurposeCode': purpose_cd
+            }))
+
+    dq_results = check_control_totals('pain001', file, root, ns, 'CdtTrfTxInf', tx_amounts.get)
+    return {'MsgId': pain_msg_id, 'Purposes': purposes, 'EndToEndIds': end_to_end_ids, 'DQ': dq_results}
+
+def apply_pain001_delta(delta):
+    restore_parties(delta['Parties'])
+    purpose_lookup.update(delta['Purposes'])
+    dq.record(delta['DQ'])
+    for end_to_end in delta['EndToEndIds']:
+        dq.endtoend('pain001', delta['File'], end_to_end, delta['MsgId'])
 
-# Write separate party dims
-with open(os.path.join(OUTPUT_DIR, 'DimParty_Debtor.csv'), 'w', newline='', encoding='utf-8') as f:
-    writer = csv.DictWriter(f, fieldnames=['PartyID', 'Name', 'IBAN', 'CountryCode'])
-    writer.writeheader()
-    writer.writerows(debtors.values())
+print("Extracting parties and purpose codes from pain.001 ...")
 
-with open(os.path.join(OUTPUT_DIR, 'DimParty_Creditor.csv'), 'w', newline='', encoding='utf-8') as f:
-    writer = csv.DictWriter(f, fieldnames=['PartyID', 'Name', 'IBAN', 'CountryCode'])
-    writer.writeheader()
-    writer.writerows(creditors.values())
+run_stage('pain001', pain001_dir, process_pain001_file, apply_pain001_delta)
 
-print(f"DimParty_Debtor.csv rows: {len(debtors)}")
-print(f"DimParty_Creditor.csv rows: {len(creditors)}")
 print(f"PurposeCode lookup entries: {len(purpose_lookup)}")
 
 # ========================
@@ -175,10 +330,11 @@ print("Extracting transactions from pacs.008 ...")
 
 fact_rows = []
 
-for file in glob.glob(os.path.join(pacs008_dir, '*.xml')):
-    tree = ET.parse(file)
-    root = tree.getroot()
+def process_pacs008_file(file, raw, root, index_events):
+    """Build the FactPayments rows of one pacs.008 file."""
     ns = {'ns': root.tag.split('}')[0].strip('{')}
+    rows = []
+    tx_amounts = {}
 
     msg_id = root.findtext('.//ns:GrpHdr/ns:MsgId', namespaces=ns)
     payment_date_str = root.findtext('.//ns:GrpHdr/ns:CreDtTm', namespaces=ns)
@@ -191,6 +347,7 @@ for file in glob.glob(os.path.join(pacs008_dir, '*.xml')):
 
         # Amount & Currency
         amount, currency = extract_amount_currency(tx, ns)
+        tx_amounts[tx] = amount
 
         # Debtor (prefer tx-level)
         debtor_name, debtor_iban, debtor_country = extract_debtor_triplet(root, tx, ns)
@@ -211,7 +368,7 @@ for file in glob.glob(os.path.join(pacs008_dir, '*.xml')):
         if not purpose_code and norm_end in purpose_lookup:
             purpose_code = purpose_lookup[norm_end]
 
-        fact_rows.append({
+        rows.append({
             'PaymentID': f"{msg_id}-{instr_id}",
             'MsgId': msg_id,
             'InstrId': instr_id,
@@ -229,6 +386,54 @@ for file in glob.glob(os.path.join(pacs008_dir, '*.xml')):
             'ProcessingTimeMinutes': None
         })
 
+        if index_events is not None:
+            row = rows[-1]
+            # Raw party data: PartyIDs are only final after entity resolution
+            fields = {k: row[k] for k in (
+                'PaymentID', 'MsgId', 'InstrId', 'PaymentDate', 'Amount', 'CurrencyCode',
+                'DebtorAgentBIC', 'CreditorAgentBIC', 'PurposeCode'
+            )}
+            fields.update({'DebtorName': debtor_name, 'DebtorIBAN': debtor_iban,
+                           'CreditorName': cdtr_name, 'CreditorIBAN': cdtr_iban})
+            index_events.append((end_to_end, fields))
+
+    dq_results = check_control_totals('pacs008', file, root, ns, 'CdtTrfTxInf', tx_amounts.get)
+    return {'FactRows': rows, 'DQ': dq_results}
+
+def apply_pacs008_delta(delta):
+    restore_parties(delta['Parties'])
+    fact_rows.extend(delta['FactRows'])
+    dq.record(delta['DQ'])
+    for row in delta['FactRows']:
+        dq.endtoend('pacs008', delta['File'], row['EndToEndId'], row['MsgId'])
+
+run_stage('pacs008', pacs008_dir, process_pacs008_file, apply_pacs008_delta)
+
+# ========================
+# PARTY ENTITY RESOLUTION
+# ========================
+print("Resolving party entities ...")
+
+party_fields = ['PartyID', 'Name', 'IBAN', 'CountryCode']
+party_id_map = {}
+
+for role, registry, prefix in (('Debtor', debtors, 'D'), ('Creditor', creditors, 'C')):
+    crosswalk_path = os.path.join(OUTPUT_DIR, f'PartyCrosswalk_{role}.csv')
+    dim_rows, crosswalk_rows, id_map = resolve_parties(registry, prefix, load_crosswalk(crosswalk_path))
+    party_id_map.update(id_map)
+
+    with open(os.path.join(OUTPUT_DIR, f'DimParty_{role}.csv'), 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=party_fields)
+        writer.writeheader()
+        writer.writerows(dim_rows)
+    write_crosswalk(crosswalk_path, crosswalk_rows)
+
+    print(f"DimParty_{role}.csv rows: {len(dim_rows)} (merged from {len(registry)} registrations)")
+
+for row in fact_rows:
+    row['DebtorID'] = party_id_map.get(row['DebtorID'], row['DebtorID'])
+    row['CreditorID'] = party_id_map.get(row['CreditorID'], row['CreditorID'])
+
 # Write FactPayments initial
 with open(os.path.join(OUTPUT_DIR, 'FactPayments.csv'), 'w', newline='', encoding='utf-8') as f:
     writer = csv.DictWriter(f, fieldnames=fact_rows[0].keys())
@@ -244,27 +449,59 @@ print("Enriching FactPayments with pacs.002 ...")
 index_by_endtoend = { (row['EndToEndId'] or '').strip().upper(): row
                       for row in fact_rows if row['EndToEndId'] }
 
-for file in glob.glob(os.path.join(pacs002_dir, '*.xml')):
-    tree = ET.parse(file)
-    root = tree.getroot()
+def process_pacs002_file(file, raw, root, index_events):
+    """Collect the status events of one pacs.002 file that match a payment."""
     ns = {'ns': root.tag.split('}')[0].strip('{')}
+    status_events = []
+
+    sts_msg_id = root.findtext('.//ns:GrpHdr/ns:MsgId', namespaces=ns)
 
     for tx in root.findall('.//ns:TxInfAndSts', ns):
         org_endtoend = (tx.findtext('.//ns:OrgnlEndToEndId', namespaces=ns) or '').strip().upper()
         tx_status = tx.findtext('.//ns:TxSts', namespaces=ns)
         accpt_time_str = tx.findtext('.//ns:AccptncDtTm', namespaces=ns)
+        accpt_time = parse_datetime(accpt_time_str)
+        if accpt_time_str and accpt_time is None:
+            raise ValueError(f"Invalid AccptncDtTm {accpt_time_str!r} for {org_endtoend}")
+
+        orgnl_tx_ref = tx.find('.//ns:OrgnlTxRef', ns)
+        amount, currency = (extract_amount_currency(orgnl_tx_ref, ns)
+                            if orgnl_tx_ref is not None else (None, None))
+
+        if index_events is not None:
+            index_events.append((org_endtoend, {
+                'MsgId': sts_msg_id,
+                'OrgnlInstrId': tx.findtext('.//ns:OrgnlInstrId', namespaces=ns),
+                'TxSts': tx_status,
+                'AccptncDtTm': accpt_time_str,
+                'Amount': amount,
+                'CurrencyCode': currency
+            }))
+
+        row = index_by_endtoend.get(org_endtoend)
+        if row is not None:
+            # Ready-to-assign values: applying the delta cannot fail
+            status_events.append([sts_msg_id, org_endtoend, tx_status,
+                                  accpt_time.isoformat() if accpt_time else None,
+                                  minutes_between(row['PaymentDate'], accpt_time) if accpt_time else None,
+                                  amount, currency])
+
+    return {'StatusEvents': status_events}
+
+def apply_pacs002_delta(delta):
+    for sts_msg_id, org_endtoend, tx_status, settlement_date, minutes, amount, currency in delta['StatusEvents']:
+        row = index_by_endtoend.get(org_endtoend)
+        if row is None:
+            continue
+        dq.record(status_amount(delta['File'], sts_msg_id, org_endtoend, amount, currency, row))
+        if tx_status:
+            row['StatusCode'] = tx_status
+        if settlement_date:
+            row['SettlementDate'] = settlement_date
+            if minutes is not None:
+                row['ProcessingTimeMinutes'] = minutes
 
-        if org_endtoend in index_by_endtoend:
-            row = index_by_endtoend[org_endtoend]
-            if tx_status:
-                row['StatusCode'] = tx_status
-            if accpt_time_str:
-                accpt_time = parse_datetime(accpt_time_str)
-                row['SettlementDate'] = accpt_time.isoformat()
-                if row['PaymentDate']:
-                    payment_dt = datetime.fromisoformat(row['PaymentDate'])
-                    diff = (accpt_time - payment_dt).total_seconds() / 60
-                    row['ProcessingTimeMinutes'] = round(diff, 2)
+run_stage('pacs002', pacs002_dir, process_pacs002_file, apply_pacs002_delta)
 
 # Rewrite FactPayments after pacs.002
 with open(os.path.join(OUTPUT_DIR, 'FactPayments.csv'), 'w', newline='', encoding='utf-8') as f:
@@ -278,28 +515,53 @@ print("FactPayments.csv enriched with pacs.002")
 # ========================
 print("Reconciling payments with camt.054 ...")
 
-for file in glob.glob(os.path.join(camt054_dir, '*.xml')):
-    tree = ET.parse(file)
-    root = tree.getroot()
+def process_camt054_file(file, raw, root, index_events):
+    """Collect the booking events of one camt.054 file that match a payment."""
     ns = {'ns': root.tag.split('}')[0].strip('{')}
+    booking_events = []
+
+    ntfctn_msg_id = root.findtext('.//ns:GrpHdr/ns:MsgId', namespaces=ns)
 
     for entry in root.findall('.//ns:Ntry', ns):
         booking_date_str = entry.findtext('.//ns:BookgDt/ns:Dt', namespaces=ns)
-        booking_date = parse_datetime(booking_date_str) if booking_date_str else None
 
         end_to_end_el = entry.find('.//ns:EndToEndId', ns)
         if end_to_end_el is None:
+            # Keep the entry list aligned with the Ntry byte offsets
+            if index_events is not None:
+                index_events.append((None, None))
             continue
         end_to_end_id = (end_to_end_el.text or '').strip().upper()
 
-        if end_to_end_id in index_by_endtoend:
-            row = index_by_endtoend[end_to_end_id]
-            if not row['SettlementDate'] and booking_date:
-                row['SettlementDate'] = booking_date.isoformat()
-                if row['PaymentDate']:
-                    payment_dt = datetime.fromisoformat(row['PaymentDate'])
-                    diff = (booking_date - payment_dt).total_seconds() / 60
-                    row['ProcessingTimeMinutes'] = round(diff, 2)
+        if index_events is not None:
+            amount, currency = extract_amount_currency(entry, ns)
+            index_events.append((end_to_end_id, {
+                'MsgId': ntfctn_msg_id,
+                'BookingDate': booking_date_str,
+                'Amount': amount,
+                'CurrencyCode': currency,
+                'CdtDbtInd': entry.findtext('.//ns:CdtDbtInd', namespaces=ns)
+            }))
+
+        row = index_by_endtoend.get(end_to_end_id)
+        booking_date = parse_datetime(booking_date_str)
+        if row is not None and booking_date is not None:
+            booking_events.append([end_to_end_id, booking_date.isoformat(),
+                                   minutes_between(row['PaymentDate'], booking_date)])
+
+    return {'BookingEvents': booking_events}
+
+def apply_camt054_delta(delta):
+    for end_to_end_id, settlement_date, minutes in delta['BookingEvents']:
+        row = index_by_endtoend.get(end_to_end_id)
+        if row is None:
+            continue
+        if not row['SettlementDate']:
+            row['SettlementDate'] = settlement_date
+            if minutes is not None:
+                row['ProcessingTimeMinutes'] = minutes
+
+run_stage('camt054', camt054_dir, process_camt054_file, apply_camt054_delta)
 
 # Final FactPayments write
 with open(os.path.join(OUTPUT_DIR, 'FactPayments.csv'), 'w', newline='', encoding='utf-8') as f:
@@ -308,6 +570,14 @@ with open(os.path.join(OUTPUT_DIR, 'FactPayments.csv'), 'w', newline='', encodin
     writer.writerows(fact_rows)
 print("FactPayments.csv reconciled with camt.054")
 
+# ========================
+# DATA QUALITY REPORT
+# ========================
+dq.write_report(os.path.join(OUTPUT_DIR, 'DQReport.csv'))
+print(f"DQReport.csv written with {len(dq.issues)} issues")
+for line in dq.summary():
+    print(f" - {line}")
+
 # ========================
 # DIMENSIONS
 # ========================
@@ -362,8 +632,17 @@ print("ETL complete. Generated:")
 print(" - FactPayments.csv")
 print(" - DimParty_Debtor.csv")
 print(" - DimParty_Creditor.csv")
+print(" - PartyCrosswalk_Debtor.csv")
+print(" - PartyCrosswalk_Creditor.csv")
 print(" - DimStatus.csv")
 print(" - DimCurrency.csv")
 print(" - DimPurposeCode.csv")
 print(" - DimDateTime_Payment.csv")
-print(" - DimDateTime_Settlement.csv")
\ No newline at end of file
+print(" - DimDateTime_Settlement.csv")
+print(" - DQReport.csv")
+print(" - lifecycle_index.sqlite")
+if checkpoint.failed:
+    print(f"{len(checkpoint.failed)} file(s) failed and were sent to {DEAD_LETTER_DIR}")
+
+lifecycle_index.close()
+checkpoint.finish()
\ No newline at end of file
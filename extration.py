@@ -8,12 +8,14 @@ import os
 import glob
 import csv
 import xml.etree.ElementTree as ET
+from etl_checkpoint import dead_letter
 
 # ========================
 # CONFIG
 # ========================
 BASE_DIR = 'data'   # Adjust to your folder structure
 STAGING_DIR = 'staging'
+DEAD_LETTER_DIR = os.path.join(STAGING_DIR, 'dead_letter')
 os.makedirs(STAGING_DIR, exist_ok=True)
 
 DIRS = {
@@ -114,7 +116,8 @@ if __name__ == '__main__':
                 rows = parse_xml_file(xml_file)
                 all_rows.extend(rows)
             except Exception as e:
-                print(f"Error parsing {xml_file}: {e}")
+                dead_letter(DEAD_LETTER_DIR, msg_type, xml_file, e)
+                print(f"Error parsing {xml_file}: {e} (sent to {DEAD_LETTER_DIR})")
 
         write_csv(all_rows, out_csv)
         print(f"[{msg_type}] Extracted {len(all_rows)} rows → {out_csv}")
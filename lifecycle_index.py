@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+"""
+Persistent EndToEndId lifecycle index for ISO 20022 payments.
+
+The ETL records every lifecycle event (pain.001 -> pacs.008 -> pacs.002 -> camt.054)
+in a SQLite file keyed by normalized EndToEndId. Each event points back to the
+source XML file and the byte offset of its transaction element, together with the
+fields extracted during parsing, so a single payment can be traced without
+re-reading the XML corpus or loading FactPayments.csv.
+
+Usage:
+    python lifecycle_index.py E2E-20250921-00081 [E2E-...] [--db output/lifecycle_index.sqlite]
+"""
+
+import os
+import re
+import json
+import sqlite3
+import argparse
+from datetime import datetime, timezone
+from functools import lru_cache
+from urllib.request import pathname2url
+
+# ========================
+# CONFIG
+# ========================
+DEFAULT_INDEX_PATH = os.path.join('output', 'lifecycle_index.sqlite')
+
+# Lifecycle order, used to sort events of a payment
+STAGES = ('pain001', 'pacs008', 'pacs002', 'camt054')
+
+# Transaction-level element each event offset points at
+STAGE_ELEMENTS = {
+    'pain001': 'CdtTrfTxInf',
+    'pacs008': 'CdtTrfTxInf',
+    'pacs002': 'TxInfAndSts',
+    'camt054': 'Ntry',
+}
+
+# Event fields holding the time of the event, used to order events within a stage
+EVENT_TIME_FIELDS = ('AccptncDtTm', 'PaymentDate', 'BookingDate', 'CreDtTm')
+
+LOOKUP_CACHE_SIZE = 4096
+
+# Version of the per-event fields written by the ETL; bump it when they change
+# so existing indexes are rebuilt instead of serving the old fields.
+# 2: pacs.008 events carry debtor/creditor name and IBAN instead of PartyIDs
+FIELDS_VERSION = 2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS source_files (
+    source_file TEXT PRIMARY KEY,
+    stage       TEXT NOT NULL,
+    mtime_ns    INTEGER NOT NULL,
+    size        INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS lifecycle_events (
+    end_to_end_id TEXT NOT NULL,
+    stage         TEXT NOT NULL,
+    source_file   TEXT NOT NULL,
+    byte_offset   INTEGER,
+    fields        TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_events_endtoend ON lifecycle_events (end_to_end_id);
+CREATE INDEX IF NOT EXISTS idx_events_source ON lifecycle_events (source_file);
+"""
+
+# ========================
+# HELPERS
+# ========================
+def normalize_endtoend(value):
+    """Normalize an EndToEndId the same way the ETL joins on it."""
+    return (value or '').strip().upper()
+
+def element_offsets(raw, local_tag):
+    """
+    Byte offsets of every <local_tag> start tag in raw XML, in document order.
+    Matches the order of root.findall('.//ns:<local_tag>') for non-nested elements.
+    """
+    pattern = re.compile(rb'<(?:[\w.-]+:)?' + re.escape(local_tag.encode('ascii')) + rb'[\s/>]')
+    return [m.start() for m in pattern.finditer(raw)]
+
+def _event_time(fields):
+    """UTC datetime of an event for ordering; naive timestamps are taken as UTC."""
+    for name in EVENT_TIME_FIELDS:
+        value = fields.get(name)
+        if not value:
+            continue
+        try:
+            dt = datetime.fromisoformat(value.replace('Z', ''))
+        except ValueError:
+            continue
+        return dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt.astimezone(timezone.utc)
+    return None
+
+def _event_sort_key(event):
+    stage = event['Stage']
+    event_time = _event_time(event['Fields'])
+    return (STAGES.index(stage) if stage in STAGES else len(STAGES),
+            event_time is None, event_time or datetime.min.replace(tzinfo=timezone.utc),
+            event['SourceFile'], event['ByteOffset'] if event['ByteOffset'] is not None else -1)
+
+def _file_signature(source_file, st=None):
+    st = st or os.stat(source_file)
+    return st.st_mtime_ns, st.st_size
+
+# ========================
+# INDEX
+# ========================
+class LifecycleIndex:
+    """
+    SQLite-backed EndToEndId -> lifecycle events index.
+    With read_only=True the file is opened without writing anything to it.
+    """
+
+    def __init__(self, path=DEFAULT_INDEX_PATH, read_only=False):
+        self.path = path
+        if read_only:
+            uri = 'file:' + pathname2url(os.path.abspath(path)) + '?mode=ro'
+            self.conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            return
+        parent = os.path.dirname(path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+        if self.conn.execute('PRAGMA user_version').fetchone()[0] != FIELDS_VERSION:
+            with self.conn:
+                self.conn.execute('DELETE FROM lifecycle_events')
+                self.conn.execute('DELETE FROM source_files')
+                self.conn.execute(f'PRAGMA user_version = {FIELDS_VERSION:d}')
+
+    def generation(self):
+        """Changes whenever another connection commits to the index."""
+        return self.conn.execute('PRAGMA data_version').fetchone()[0]
+
+    def is_current(self, source_file, st=None):
+        """
+        True if source_file is already indexed and unchanged on disk.
+        st: os.stat_result of the file if the caller has one, saves a stat() call.
+        """
+        row = self.conn.execute(
+            'SELECT mtime_ns, size FROM source_files WHERE source_file = ?', (source_file,)
+        ).fetchone()
+        return row is not None and tuple(row) == _file_signature(source_file, st)
+
+    def replace_file(self, source_file, stage, events, st=None):
+        """
+        Replace all events of source_file in a single transaction.
+        events: iterable of (end_to_end_id, byte_offset, fields_dict).
+        """
+        mtime_ns, size = _file_signature(source_file, st)
+        rows = [
+            (normalize_endtoend(e2e), stage, source_file, offset,
+             json.dumps(fields, ensure_ascii=False, default=str))
+            for e2e, offset, fields in events
+            if normalize_endtoend(e2e)
+        ]
+        with self.conn:
+            self.conn.execute('DELETE FROM lifecycle_events WHERE source_file = ?', (source_file,))
+            self.conn.executemany(
+                'INSERT INTO lifecycle_events (end_to_end_id, stage, source_file, byte_offset, fields) '
+                'VALUES (?, ?, ?, ?, ?)', rows
+            )
+            self.conn.execute(
+                'INSERT OR REPLACE INTO source_files (source_file, stage, mtime_ns, size) VALUES (?, ?, ?, ?)',
+                (source_file, stage, mtime_ns, size)
+            )
+
+    def lookup(self, end_to_end_id):
+        """
+        All lifecycle events of a payment, ordered pain.001 -> camt.054 and, within
+        a stage, by event time (AccptncDtTm, PaymentDate, ...) then file position.
+        """
+        cur = self.conn.execute(
+            'SELECT stage, source_file, byte_offset, fields FROM lifecycle_events '
+            'WHERE end_to_end_id = ?', (normalize_endtoend(end_to_end_id),)
+        )
+        events = [
+            {'Stage': stage, 'SourceFile': source_file, 'ByteOffset': offset,
+             'Fields': json.loads(fields) if fields else {}}
+            for stage, source_file, offset, fields in cur
+        ]
+        events.sort(key=_event_sort_key)
+        return events
+
+    def close(self):
+        self.conn.close()
+
+# ========================
+# CACHED LOOKUP API
+# ========================
+_open_indexes = {}  # db_path -> (inode, read-only LifecycleIndex)
+
+def _open_index(db_path):
+    """One read-only connection per db_path, reopened when the file is replaced."""
+    inode = os.stat(db_path).st_ino
+    opened = _open_indexes.get(db_path)
+    if opened is None or opened[0] != inode:
+        if opened is not None:
+            opened[1].close()
+        opened = _open_indexes[db_path] = (inode, LifecycleIndex(db_path, read_only=True))
+    return opened[1]
+
+@lru_cache(maxsize=LOOKUP_CACHE_SIZE)
+def _cached_lookup(index, generation, norm_end):
+    # Keyed on the connection, so entries of a replaced index file are never served
+    return tuple(index.lookup(norm_end))
+
+def lookup_endtoend(end_to_end_id, db_path=DEFAULT_INDEX_PATH):
+    """
+    LRU-cached, read-only lookup of the lifecycle events of one EndToEndId.
+    Cache entries are keyed on the index generation, so updates made by the
+    ETL in another process are picked up on the next call.
+    """
+    index = _open_index(db_path)
+    return list(_cached_lookup(index, index.generation(), normalize_endtoend(end_to_end_id)))
+
+def read_event_xml(event, max_bytes=65536):
+    """Return the raw XML of an event's transaction element, read at its byte offset."""
+    if event.get('ByteOffset') is None:
+        return None
+    with open(event['SourceFile'], 'rb') as f:
+        f.seek(event['ByteOffset'])
+        chunk = f.read(max_bytes)
+    tag = STAGE_ELEMENTS.get(event['Stage'])
+    if tag:
+        m = re.search(rb'</(?:[\w.-]+:)?' + re.escape(tag.encode('ascii')) + rb'>', chunk)
+        if m:
+            chunk = chunk[:m.end()]
+    return chunk.decode('utf-8', errors='replace')
+
+# ========================
+# CLI
+# ========================
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Trace payments by EndToEndId in the lifecycle index.')
+    parser.add_argument('end_to_end_ids', nargs='+', metavar='EndToEndId')
+    parser.add_argument('--db', default=DEFAULT_INDEX_PATH, help='lifecycle index SQLite file')
+    parser.add_argument('--xml', action='store_true', help='include the raw XML of each event')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        parser.error(f"index not found: {args.db} (run etl_iso20022.py first)")
+
+    for e2e in args.end_to_end_ids:
+        events = lookup_endtoend(e2e, args.db)
+        if args.xml:
+            events = [dict(e, Xml=read_event_xml(e)) for e in events]
+        print(json.dumps({'EndToEndId': normalize_endtoend(e2e), 'Events': events},
+                         indent=2, ensure_ascii=False))
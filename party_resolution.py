@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+"""
+Blocking-based entity resolution for the DimParty_Debtor / DimParty_Creditor dimensions.
+
+The ETL registers parties on the exact (name, iban) tuple. This stage merges the
+registrations that refer to the same party (different casing, punctuation,
+whitespace or a missing IBAN) into canonical parties:
+
+1. Names and IBANs are normalized; exact normalized duplicates are merged by hashing.
+2. Each remaining record gets blocking keys (IBAN, country + name token, phonetic key)
+   and is only compared with the other records of its blocks, so the cost grows
+   with the number of records and not with the number of pairs.
+3. Two different non-empty IBANs are never merged, directly or transitively.
+4. Canonical PartyIDs are kept stable across runs through a crosswalk table
+   (source Name/IBAN -> CanonicalPartyID) stored next to the dimensions.
+"""
+
+import os
+import re
+import csv
+import unicodedata
+from difflib import SequenceMatcher
+
+# ========================
+# CONFIG
+# ========================
+NAME_MATCH_THRESHOLD = 0.92       # similarity needed when at least one IBAN is missing
+IBAN_NAME_MATCH_THRESHOLD = 0.6   # similarity needed between names sharing an IBAN
+MAX_BLOCK_SIZE = 200              # larger name blocks are too generic to compare pairwise
+
+CROSSWALK_FIELDS = ['SourceName', 'SourceIBAN', 'SourceCountryCode', 'CanonicalPartyID']
+
+# ========================
+# NORMALIZATION & BLOCKING
+# ========================
+def normalize_party_name(name):
+    """Casefold, strip accents and punctuation, collapse whitespace."""
+    if not name:
+        return ''
+    text = unicodedata.normalize('NFKD', name)
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    text = re.sub(r'[^\w\s]', ' ', text.casefold())
+    return ' '.join(text.split())
+
+def normalize_iban(iban):
+    """Uppercase IBAN without spaces."""
+    return re.sub(r'\s+', '', iban or '').upper()
+
+_SOUNDEX_CODES = {}
+for _letters, _digit in (('bfpv', '1'), ('cgjkqsxz', '2'), ('dt', '3'),
+                         ('l', '4'), ('mn', '5'), ('r', '6')):
+    for _ch in _letters:
+        _SOUNDEX_CODES[_ch] = _digit
+
+def soundex(token):
+    """American Soundex code of a single (normalized) token."""
+    letters = [ch for ch in token if 'a' <= ch <= 'z']
+    if not letters:
+        return token
+    code = letters[0].upper()
+    last = _SOUNDEX_CODES.get(letters[0], '')
+    for ch in letters[1:]:
+        digit = _SOUNDEX_CODES.get(ch, '')
+        if digit and digit != last:
+            code += digit
+        if ch not in 'hw':
+            last = digit
+    return (code + '000')[:4]
+
+def blocking_keys(norm_name, norm_iban, country):
+    """Blocking keys of one party: IBAN, country + longest name token, phonetic name."""
+    keys = []
+    if norm_iban:
+        keys.append(('IBAN', norm_iban))
+    tokens = norm_name.split()
+    if tokens:
+        keys.append(('CTRY_TOKEN', (country or '').upper(), max(tokens, key=len)))
+        keys.append(('PHONETIC', ' '.join(soundex(t) for t in tokens)))
+    return keys
+
+def name_similarity(a, b):
+    if a == b:
+        return 1.0
+    return SequenceMatcher(None, a, b).ratio()
+
+def is_match(a, b):
+    """Pairwise match rule between two normalized records."""
+    if a['iban'] and b['iban']:
+        if a['iban'] != b['iban']:
+            return False
+        if not a['name'] or not b['name']:
+            return True
+        return name_similarity(a['name'], b['name']) >= IBAN_NAME_MATCH_THRESHOLD
+
+    if not a['name'] or not b['name']:
+        return False
+    if a['country'] and b['country'] and a['country'] != b['country']:
+        return False
+    return name_similarity(a['name'], b['name']) >= NAME_MATCH_THRESHOLD
+
+# ========================
+# UNION-FIND
+# ========================
+class _Clusters:
+    """Union-find that refuses to join clusters holding different IBANs."""
+
+    def __init__(self, ibans):
+        self.parent = list(range(len(ibans)))
+        self.iban = list(ibans)
+
+    def find(self, i):
+        while self.parent[i] != i:
+            self.parent[i] = self.parent[self.parent[i]]
+            i = self.parent[i]
+        return i
+
+    def union(self, i, j):
+        ri, rj = self.find(i), self.find(j)
+        if ri == rj:
+            return True
+        if self.iban[ri] and self.iban[rj] and self.iban[ri] != self.iban[rj]:
+            return False
+        if rj < ri:
+            ri, rj = rj, ri
+        self.parent[rj] = ri
+        self.iban[ri] = self.iban[ri] or self.iban[rj]
+        return True
+
+# ========================
+# CROSSWALK
+# ========================
+def load_crosswalk(path):
+    """Read a crosswalk CSV into {(SourceName, SourceIBAN): row}."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, newline='', encoding='utf-8') as f:
+        return {(row['SourceName'], row['SourceIBAN']): row for row in csv.DictReader(f)}
+
+def write_crosswalk(path, rows):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=CROSSWALK_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+def _id_number(party_id, prefix):
+    try:
+        return int(party_id[len(prefix):]) if party_id.startswith(prefix) else 0
+    except ValueError:
+        return 0
+
+# ========================
+# RESOLUTION
+# ========================
+def resolve_parties(parties, prefix, crosswalk=None):
+    """
+    Resolve a party registry ({(name, iban): {'PartyID', 'Name', 'IBAN', 'CountryCode'}})
+    into canonical parties.
+
+    Returns (dim_rows, crosswalk_rows, id_map) where id_map translates the
+    registry PartyIDs to canonical PartyIDs.
+    """
+    crosswalk = crosswalk or {}
+    records = sorted(parties.items(), key=lambda kv: _id_number(kv[1]['PartyID'], prefix))
+    norm = [{
+        'name': normalize_party_name(p['Name']),
+        'iban': normalize_iban(p['IBAN']),
+        'country': (p['CountryCode'] or '').strip().upper(),
+    } for _, p in records]
+    clusters = _Clusters([n['iban'] for n in norm])
+
+    # 1. Exact normalized duplicates, by hashing
+    representatives = {}
+    for i, n in enumerate(norm):
+        key = (n['name'], n['iban'], n['country'])
+        if key in representatives:
+            clusters.union(representatives[key], i)
+        else:
+            representatives[key] = i
+
+    # 2. Pairwise comparison inside blocks, representatives only
+    blocks = {}
+    for i in representatives.values():
+        for key in blocking_keys(norm[i]['name'], norm[i]['iban'], norm[i]['country']):
+            blocks.setdefault(key, []).append(i)
+
+    for key, members in blocks.items():
+        # A shared IBAN is the strongest key: its block is always compared in full
+        if len(members) < 2 or (len(members) > MAX_BLOCK_SIZE and key[0] != 'IBAN'):
+            continue
+        for a in range(len(members)):
+            for b in range(a + 1, len(members)):
+                i, j = members[a], members[b]
+                if clusters.find(i) != clusters.find(j) and is_match(norm[i], norm[j]):
+                    clusters.union(i, j)
+
+    # 3. Stable canonical IDs: reuse crosswalk IDs, allocate new ones after the highest known
+    members_by_root = {}
+    for i in range(len(records)):
+        members_by_root.setdefault(clusters.find(i), []).append(i)
+
+    next_number = max((_id_number(row['CanonicalPartyID'], prefix) for row in crosswalk.values()),
+                      default=0) + 1
+    dim_rows, id_map, used_ids, retired = [], {}, set(), {}
+    crosswalk_rows = dict(crosswalk)
+
+    for root in sorted(members_by_root):
+        members = members_by_root[root]
+        known = sorted({crosswalk[records[i][0]]['CanonicalPartyID']
+                        for i in members if records[i][0] in crosswalk} - used_ids,
+                       key=lambda pid: _id_number(pid, prefix))
+        if known:
+            canonical_id = known[0]
+            # IDs of previously separate parties now merged into this one
+            for old_id in known[1:]:
+                retired[old_id] = canonical_id
+        else:
+            canonical_id = f"{prefix}{next_number:05d}"
+            next_number += 1
+        used_ids.add(canonical_id)
+
+        first = records[members[0]][1]
+        dim_rows.append({
+            'PartyID': canonical_id,
+            'Name': first['Name'] or next((records[i][1]['Name'] for i in members if records[i][1]['Name']), None),
+            'IBAN': first['IBAN'] or next((records[i][1]['IBAN'] for i in members if records[i][1]['IBAN']), None),
+            'CountryCode': first['CountryCode'] or next(
+                (records[i][1]['CountryCode'] for i in members if records[i][1]['CountryCode']), None),
+        })
+        for i in members:
+            key, party = records[i]
+            id_map[party['PartyID']] = canonical_id
+            crosswalk_rows[key] = {
+                'SourceName': key[0],
+                'SourceIBAN': key[1],
+                'SourceCountryCode': party['CountryCode'] or '',
+                'CanonicalPartyID': canonical_id,
+            }
+
+    # An ID retired by one merge may still be the canonical ID of a later cluster
+    retired = {old_id: new_id for old_id, new_id in retired.items() if old_id not in used_ids}
+    for row in crosswalk_rows.values():
+        if row['CanonicalPartyID'] in retired:
+            row['CanonicalPartyID'] = retired[row['CanonicalPartyID']]
+
+    return dim_rows, list(crosswalk_rows.values()), id_map
@@ -0,0 +1,67 @@
+from data_quality import DataQuality, control_totals, status_amount
+
+
+def test_status_issues_name_the_status_report_message():
+    payment = {'MsgId': 'PACS008-1', 'Amount': '100.00', 'CurrencyCode': 'EUR'}
+    results = status_amount('pacs002.xml', 'PACS002-1', 'E2E-1', '99.00', 'USD', payment)
+
+    issues = [issue for _, issue in results]
+    assert [i['Check'] for i in issues] == ['STATUS_AMOUNT', 'STATUS_CURRENCY']
+    assert {(i['SourceFile'], i['MsgId']) for i in issues} == {('pacs002.xml', 'PACS002-1')}
+    assert [(i['Expected'], i['Actual']) for i in issues] == [('100.00', '99.00'), ('EUR', 'USD')]
+
+
+def test_matching_status_amount_passes():
+    payment = {'MsgId': 'PACS008-1', 'Amount': '100.00', 'CurrencyCode': 'EUR'}
+    results = status_amount('pacs002.xml', 'PACS002-1', 'E2E-1', '100.0', 'EUR', payment)
+    assert results == [['STATUS_AMOUNT', None], ['STATUS_CURRENCY', None]]
+
+
+def test_control_totals_pass_on_matching_declarations():
+    results = control_totals('pain001', 'pain001.xml', 'PAIN-1', ' 2 ', '150.50', ['100.00', '50.5'])
+    assert results == [['CONTROL_NB_OF_TXS', None], ['CONTROL_CTRL_SUM', None]]
+
+
+def test_control_totals_report_count_and_sum_mismatches():
+    results = control_totals('pain001', 'pain001.xml', 'PAIN-1', '3', '200.00', ['100.00', '50.50'])
+
+    issues = {check: issue for check, issue in results}
+    assert (issues['CONTROL_NB_OF_TXS']['Expected'], issues['CONTROL_NB_OF_TXS']['Actual']) == ('3', 2)
+    assert (issues['CONTROL_CTRL_SUM']['Expected'], issues['CONTROL_CTRL_SUM']['Actual']) == ('200.00', '150.50')
+    assert issues['CONTROL_CTRL_SUM']['MsgId'] == 'PAIN-1'
+
+
+def test_control_sum_fails_on_missing_or_invalid_amount():
+    # The valid amounts alone add up to the declared sum
+    for amounts in (['100.00', None], ['100.00', 'n/a']):
+        [[check, issue]] = control_totals('pacs008', 'pacs008.xml', 'PACS008-1', None, '100.00', amounts)
+        assert check == 'CONTROL_CTRL_SUM'
+        assert issue is not None and issue['Actual'] == '100.00'
+
+
+def test_control_sum_fails_on_invalid_declaration():
+    [[_, issue]] = control_totals('pacs008', 'pacs008.xml', 'PACS008-1', None, 'abc', ['1.00'])
+    assert issue['Expected'] == 'abc'
+
+
+def test_duplicate_endtoend_across_files_of_a_stage():
+    dq = DataQuality()
+    dq.endtoend('pacs008', 'a.xml', 'E2E-1', 'PACS008-1')
+    dq.endtoend('pacs008', 'b.xml', ' e2e-1 ', 'PACS008-2')
+    dq.endtoend('pain001', 'c.xml', 'E2E-1', 'PAIN-1')
+    dq.endtoend('pacs008', 'b.xml', '', 'PACS008-2')
+
+    assert dq.checked['DUPLICATE_ENDTOEND'] == 3
+    [issue] = dq.issues
+    assert (issue['Stage'], issue['SourceFile'], issue['MsgId'], issue['EndToEndId']) == \
+        ('pacs008', 'b.xml', 'PACS008-2', 'E2E-1')
+
+
+def test_many_unique_endtoends_report_no_duplicates():
+    dq = DataQuality()
+    for n in range(200000):
+        dq.endtoend('pacs008', 'a.xml', f'E2E-{n:08d}')
+    dq.endtoend('pacs008', 'b.xml', 'E2E-00123456')
+
+    assert dq.checked['DUPLICATE_ENDTOEND'] == 200001
+    assert [issue['EndToEndId'] for issue in dq.issues] == ['E2E-00123456']
@@ -0,0 +1,69 @@
+import os
+
+from etl_checkpoint import Checkpoint
+
+
+def write_source(tmp_path, name, text='<Document/>'):
+    path = tmp_path / name
+    path.write_text(text, encoding='utf-8')
+    return str(path)
+
+
+def test_resume_skips_done_and_unchanged_failed_files(tmp_path):
+    done = write_source(tmp_path, 'done.xml')
+    failed = write_source(tmp_path, 'failed.xml', '<Document>')
+    checkpoint = Checkpoint(str(tmp_path / 'checkpoint'))
+    checkpoint.commit('pacs002', done, {'StatusEvents': []})
+    checkpoint.record_failure('pacs002', failed, ValueError('broken'))
+
+    resumed = Checkpoint(str(tmp_path / 'checkpoint'))
+    assert resumed.is_done('pacs002', done)
+    assert resumed.is_done('pacs002', failed)
+    assert resumed.replay('pacs002') == [{'StatusEvents': []}]
+
+
+def test_fixed_dead_lettered_file_is_pending_on_resume(tmp_path):
+    failed = write_source(tmp_path, 'failed.xml', '<Document>')
+    checkpoint = Checkpoint(str(tmp_path / 'checkpoint'))
+    checkpoint.record_failure('pacs002', failed, ValueError('broken'))
+
+    write_source(tmp_path, 'failed.xml', '<Document/>\n')
+    resumed = Checkpoint(str(tmp_path / 'checkpoint'))
+    assert not resumed.is_done('pacs002', failed)
+
+    resumed.commit('pacs002', failed, {'StatusEvents': []})
+    assert resumed.is_done('pacs002', failed)
+    assert not resumed.failed
+
+
+def test_journal_of_another_version_is_discarded(tmp_path):
+    directory = tmp_path / 'checkpoint'
+    directory.mkdir()
+    done = write_source(tmp_path, 'done.xml')
+    (directory / 'journal.jsonl').write_text(
+        '{"Stage": "pacs002", "File": "%s", "Status": "done", "Signature": %s, "Delta": {}}\n'
+        % (done, list((os.stat(done).st_size, os.stat(done).st_mtime_ns))), encoding='utf-8')
+
+    checkpoint = Checkpoint(str(directory))
+    assert not checkpoint.is_done('pacs002', done)
+    assert checkpoint.replay('pacs002') == []
+
+
+def test_discarded_stages_are_dropped_from_the_journal(tmp_path):
+    pacs008 = write_source(tmp_path, 'pacs008.xml')
+    pacs002 = write_source(tmp_path, 'pacs002.xml')
+    camt054 = write_source(tmp_path, 'camt054.xml', '<Document>')
+    checkpoint = Checkpoint(str(tmp_path / 'checkpoint'))
+    checkpoint.commit('pacs008', pacs008, {'FactRows': []})
+    checkpoint.commit('pacs002', pacs002, {'StatusEvents': []})
+    checkpoint.record_failure('camt054', camt054, ValueError('broken'))
+
+    resumed = Checkpoint(str(tmp_path / 'checkpoint'))
+    assert resumed.discard(('pacs002', 'camt054')) == 2
+    assert not resumed.is_done('pacs002', pacs002)
+    assert not resumed.is_done('camt054', camt054)
+
+    reloaded = Checkpoint(str(tmp_path / 'checkpoint'))
+    assert reloaded.is_done('pacs008', pacs008)
+    assert reloaded.replay('pacs002') == []
+    assert not reloaded.failed
@@ -0,0 +1,121 @@
+import csv
+import os
+import subprocess
+import sys
+
+import pytest
+
+pytest.importorskip('pandas')
+
+ETL_SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'etl_iso20022.py')
+
+PAIN001 = """<?xml version='1.0' encoding='utf-8'?>
+<Document xmlns="urn:iso:std:iso:20022:tech:xsd:pain.001.001.09">
+  <CstmrCdtTrfInitn>
+    <GrpHdr><MsgId>PAIN-1</MsgId><CreDtTm>2025-09-21T08:00:00Z</CreDtTm><NbOfTxs>1</NbOfTxs></GrpHdr>
+    <PmtInf>
+      <Dbtr><Nm>Global Finance SpA</Nm></Dbtr>
+      <DbtrAcct><Id><IBAN>SE6510619244403548659086</IBAN></Id></DbtrAcct>
+      <CdtTrfTxInf>
+        <PmtId><InstrId>INST-1</InstrId><EndToEndId>E2E-1</EndToEndId></PmtId>
+        <Amt><InstdAmt Ccy="EUR">100.00</InstdAmt></Amt>
+        <Cdtr><Nm>Peter Dubois</Nm><PstlAdr><Ctry>DE</Ctry></PstlAdr></Cdtr>
+        <CdtrAcct><Id><IBAN>DE7133045310603257969962</IBAN></Id></CdtrAcct>
+        <Purp><Cd>SERV</Cd></Purp>
+      </CdtTrfTxInf>
+    </PmtInf>
+  </CstmrCdtTrfInitn>
+</Document>
+"""
+
+PACS008 = """<?xml version='1.0' encoding='utf-8'?>
+<Document xmlns="urn:iso:std:iso:20022:tech:xsd:pacs.008.001.10">
+  <FIToFICstmrCdtTrf>
+    <GrpHdr><MsgId>PACS008-1</MsgId><CreDtTm>2025-09-21T08:58:00+00:00Z</CreDtTm><NbOfTxs>1</NbOfTxs></GrpHdr>
+    <CdtTrfTxInf>
+      <PmtId><InstrId>INST-1</InstrId><EndToEndId>E2E-1</EndToEndId></PmtId>
+      <IntrBkSttlmAmt Ccy="EUR">100.00</IntrBkSttlmAmt>
+      <Dbtr><Nm>Global Finance SpA</Nm></Dbtr>
+      <DbtrAcct><Id><IBAN>SE6510619244403548659086</IBAN></Id></DbtrAcct>
+      <Cdtr><Nm>Peter Dubois</Nm></Cdtr>
+      <CdtrAcct><Id><IBAN>DE7133045310603257969962</IBAN></Id></CdtrAcct>
+    </CdtTrfTxInf>
+  </FIToFICstmrCdtTrf>
+</Document>
+"""
+
+# AccptncDtTm without an offset, while the pacs.008 CreDtTm carries one
+PACS002 = """<?xml version='1.0' encoding='utf-8'?>
+<Document xmlns="urn:iso:std:iso:20022:tech:xsd:pacs.002.001.10">
+  <FIToFIPmtStsRpt>
+    <GrpHdr><MsgId>PACS002-1</MsgId><CreDtTm>2025-09-21T10:57:00</CreDtTm></GrpHdr>
+    <OrgnlPmtInfAndSts>
+      <TxInfAndSts>
+        <OrgnlInstrId>INST-1</OrgnlInstrId>
+        <OrgnlEndToEndId>E2E-1</OrgnlEndToEndId>
+        <TxSts>ACSC</TxSts>
+        <AccptncDtTm>2025-09-21T10:57:00</AccptncDtTm>
+        <OrgnlTxRef><Amt><InstdAmt Ccy="EUR">100.00</InstdAmt></Amt></OrgnlTxRef>
+      </TxInfAndSts>
+    </OrgnlPmtInfAndSts>
+  </FIToFIPmtStsRpt>
+</Document>
+"""
+
+
+# Runs the ETL but stops before the checkpoint journal is removed, as a killed run would
+INTERRUPTED_RUN = f"""
+import sys, runpy
+sys.path.insert(0, {os.path.dirname(ETL_SCRIPT)!r})
+import etl_checkpoint
+etl_checkpoint.Checkpoint.finish = lambda self: self._fh.close()
+runpy.run_path({ETL_SCRIPT!r}, run_name='__main__')
+"""
+
+
+def write_dataset(tmp_path):
+    for stage, text in (('pain001', PAIN001), ('pacs008', PACS008), ('pacs002', PACS002), ('camt054', None)):
+        folder = tmp_path / 'data' / f'ISO20022_{stage}'
+        folder.mkdir(parents=True)
+        if text:
+            (folder / f'{stage}_2025-09-21.xml').write_text(text, encoding='utf-8')
+
+
+def read_fact_rows(tmp_path):
+    with open(tmp_path / 'output' / 'FactPayments.csv', newline='', encoding='utf-8') as f:
+        return {row['EndToEndId']: row for row in csv.DictReader(f)}
+
+
+def test_naive_acceptance_time_is_settled_not_dead_lettered(tmp_path):
+    write_dataset(tmp_path)
+    result = subprocess.run([sys.executable, ETL_SCRIPT], cwd=tmp_path, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+
+    assert not (tmp_path / 'output' / 'dead_letter').exists()
+    [row] = read_fact_rows(tmp_path).values()
+    assert row['StatusCode'] == 'ACSC'
+    assert row['SettlementDate'] == '2025-09-21T10:57:00'
+    assert float(row['ProcessingTimeMinutes']) == 119.0
+
+
+def test_resume_after_fixing_a_pacs008_file_matches_its_statuses(tmp_path):
+    write_dataset(tmp_path)
+    pacs008 = tmp_path / 'data' / 'ISO20022_pacs008' / 'pacs008_2025-09-21.xml'
+    (tmp_path / 'data' / 'ISO20022_pacs008' / 'pacs008_2025-09-22.xml').write_text(
+        PACS008.replace('E2E-1', 'E2E-2').replace('PACS008-1', 'PACS008-2'), encoding='utf-8')
+    (tmp_path / 'data' / 'ISO20022_pacs002' / 'pacs002_2025-09-22.xml').write_text(
+        PACS002.replace('E2E-1', 'E2E-2').replace('PACS002-1', 'PACS002-2'), encoding='utf-8')
+    pacs008.write_text(PACS008[:300], encoding='utf-8')
+
+    result = subprocess.run([sys.executable, '-c', INTERRUPTED_RUN], cwd=tmp_path, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    assert 'sent to dead letter' in result.stdout
+    assert (tmp_path / 'output' / 'checkpoint' / 'journal.jsonl').exists()
+
+    pacs008.write_text(PACS008, encoding='utf-8')
+    result = subprocess.run([sys.executable, ETL_SCRIPT], cwd=tmp_path, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+
+    rows = read_fact_rows(tmp_path)
+    assert [rows[e2e]['StatusCode'] for e2e in ('E2E-1', 'E2E-2')] == ['ACSC', 'ACSC']
+    assert float(rows['E2E-1']['ProcessingTimeMinutes']) == 119.0
@@ -0,0 +1,89 @@
+import os
+import sqlite3
+
+import pytest
+
+import lifecycle_index
+from lifecycle_index import SCHEMA, LifecycleIndex, lookup_endtoend
+
+
+def write_source(tmp_path, name):
+    path = tmp_path / name
+    path.write_text('<Document/>', encoding='utf-8')
+    return str(path)
+
+
+def test_lookup_orders_statuses_by_acceptance_time(tmp_path):
+    index = LifecycleIndex(str(tmp_path / 'index.sqlite'))
+    # Indexed in the "wrong" order, as unsorted glob output may do
+    acsc = write_source(tmp_path, 'a_ACSC.xml')
+    acsp = write_source(tmp_path, 'b_ACSP.xml')
+    index.replace_file(acsc, 'pacs002', [('e2e-1', 10, {'TxSts': 'ACSC', 'AccptncDtTm': '2025-09-21T12:00:00Z'})])
+    index.replace_file(acsp, 'pacs002', [('e2e-1', 10, {'TxSts': 'ACSP', 'AccptncDtTm': '2025-09-21T10:00:00'})])
+    index.replace_file(write_source(tmp_path, 'pacs008.xml'), 'pacs008',
+                       [('E2E-1', 5, {'PaymentDate': '2025-09-21T09:00:00+00:00'})])
+
+    events = index.lookup(' E2E-1 ')
+    assert [e['Stage'] for e in events] == ['pacs008', 'pacs002', 'pacs002']
+    assert [e['Fields'].get('TxSts') for e in events[1:]] == ['ACSP', 'ACSC']
+    index.close()
+
+
+def test_cached_lookup_sees_updates_from_another_connection(tmp_path):
+    db_path = str(tmp_path / 'index.sqlite')
+    writer = LifecycleIndex(db_path)
+    writer.replace_file(write_source(tmp_path, 'pain001.xml'), 'pain001', [('E2E-2', 0, {})])
+
+    assert lookup_endtoend('E2E-9', db_path) == []
+    writer.replace_file(write_source(tmp_path, 'pacs008.xml'), 'pacs008', [('E2E-9', 0, {})])
+    assert [e['Stage'] for e in lookup_endtoend('e2e-9', db_path)] == ['pacs008']
+    writer.close()
+
+
+def test_lookup_does_not_write_to_the_index(tmp_path):
+    db_path = str(tmp_path / 'index.sqlite')
+    conn = sqlite3.connect(db_path)
+    conn.executescript(SCHEMA)
+    conn.close()
+
+    reader = LifecycleIndex(db_path, read_only=True)
+    assert reader.lookup('E2E-1') == []
+    assert reader.conn.execute('PRAGMA journal_mode').fetchone()[0] == 'delete'
+    with pytest.raises(sqlite3.OperationalError):
+        reader.conn.execute('DELETE FROM lifecycle_events')
+    reader.close()
+
+
+def test_index_with_older_fields_version_is_rebuilt(tmp_path):
+    db_path = str(tmp_path / 'index.sqlite')
+    source = write_source(tmp_path, 'pacs008.xml')
+    index = LifecycleIndex(db_path)
+    index.replace_file(source, 'pacs008', [('E2E-1', 0, {'DebtorID': 'D00001'})])
+    index.conn.execute('PRAGMA user_version = 1')
+    index.close()
+
+    index = LifecycleIndex(db_path)
+    assert not index.is_current(source)
+    assert index.lookup('E2E-1') == []
+    index.close()
+
+
+def test_replaced_index_file_reuses_one_connection(tmp_path):
+    db_path = str(tmp_path / 'index.sqlite')
+    writer = LifecycleIndex(db_path)
+    writer.replace_file(write_source(tmp_path, 'pain001.xml'), 'pain001', [('E2E-1', 0, {})])
+    writer.close()
+    assert [e['Stage'] for e in lookup_endtoend('E2E-1', db_path)] == ['pain001']
+    old_reader = lifecycle_index._open_indexes[db_path][1]
+
+    # Rebuild the index into a new file and swap it in, as a fresh deployment would
+    rebuilt_path = str(tmp_path / 'rebuilt.sqlite')
+    writer = LifecycleIndex(rebuilt_path)
+    writer.replace_file(write_source(tmp_path, 'pacs008.xml'), 'pacs008', [('E2E-1', 0, {})])
+    writer.close()
+    os.replace(rebuilt_path, db_path)
+
+    assert [e['Stage'] for e in lookup_endtoend('E2E-1', db_path)] == ['pacs008']
+    assert lifecycle_index._open_indexes[db_path][1] is not old_reader
+    with pytest.raises(sqlite3.ProgrammingError):
+        old_reader.conn.execute('SELECT 1')
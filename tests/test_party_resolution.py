@@ -0,0 +1,46 @@
+from party_resolution import MAX_BLOCK_SIZE, resolve_parties
+
+
+def registry(*parties):
+    return {(name, iban): {'PartyID': f'D{i:05d}', 'Name': name, 'IBAN': iban, 'CountryCode': None}
+            for i, (name, iban) in enumerate(parties, start=1)}
+
+
+def crosswalk(*rows):
+    return {(name, iban): {'SourceName': name, 'SourceIBAN': iban, 'SourceCountryCode': '',
+                           'CanonicalPartyID': party_id}
+            for name, iban, party_id in rows}
+
+
+def test_casing_and_missing_iban_merge_but_different_ibans_do_not():
+    dim, _, id_map = resolve_parties(
+        registry(('Acme GmbH', 'DE001'), ('ACME  gmbh', 'DE001'), ('Acme GmbH', ''), ('Acme GmbH', 'DE002')), 'D')
+    assert [row['PartyID'] for row in dim] == ['D00001', 'D00002']
+    assert id_map == {'D00001': 'D00001', 'D00002': 'D00001', 'D00003': 'D00001', 'D00004': 'D00002'}
+
+
+def test_retired_id_reused_by_another_cluster_keeps_its_crosswalk_rows():
+    previous = crosswalk(('Acme', 'X', 'D00001'), ('ACME', 'X', 'D00002'), ('Zeta', 'Z', 'D00002'))
+    dim, rows, id_map = resolve_parties(registry(('Acme', 'X'), ('ACME', 'X'), ('Zeta', 'Z')), 'D', previous)
+
+    dim_ids = {row['Name']: row['PartyID'] for row in dim}
+    crosswalk_ids = {row['SourceName']: row['CanonicalPartyID'] for row in rows}
+    assert dim_ids == {'Acme': 'D00001', 'Zeta': 'D00002'}
+    assert crosswalk_ids == {'Acme': 'D00001', 'ACME': 'D00001', 'Zeta': 'D00002'}
+    assert id_map['D00003'] == 'D00002'
+
+
+def test_crosswalk_keeps_ids_stable_across_runs():
+    parties = registry(('Acme', 'X'), ('Zeta', 'Z'))
+    _, rows, first = resolve_parties(parties, 'D')
+    previous = {(r['SourceName'], r['SourceIBAN']): r for r in rows}
+    reordered = registry(('New Co', 'N'), ('Zeta', 'Z'), ('Acme', 'X'))
+    _, _, second = resolve_parties(reordered, 'D', previous)
+    assert second == {'D00001': 'D00003', 'D00002': 'D00002', 'D00003': 'D00001'}
+
+
+def test_large_shared_iban_block_is_not_skipped():
+    names = [f'Acme Holding {n}' for n in range(MAX_BLOCK_SIZE + 1)]
+    dim, _, id_map = resolve_parties(registry(*[(name, 'DE001') for name in names]), 'D')
+    assert len(dim) == 1
+    assert set(id_map.values()) == {'D00001'}
@@ -0,0 +1,82 @@
+import os
+import time
+
+import pytest
+
+import xml_reader
+from xml_reader import ReadAhead, ReadStats
+
+
+def write_files(tmp_path, count):
+    files = []
+    for n in range(count):
+        path = tmp_path / f'{n:02d}.xml'
+        path.write_bytes(b'<Document>' + b'x' * n + b'</Document>')
+        files.append(str(path))
+    return files
+
+
+def test_files_are_delivered_in_input_order(tmp_path, monkeypatch):
+    files = write_files(tmp_path, 12)
+    read_bytes = xml_reader._read_bytes
+
+    def slow_early_files(file):
+        # Later files finish reading first
+        time.sleep(0.02 * (12 - int(os.path.basename(file)[:2])) / 12)
+        return read_bytes(file)
+
+    monkeypatch.setattr(xml_reader, '_read_bytes', slow_early_files)
+    stats = ReadStats()
+    delivered = []
+    for file, fetch in ReadAhead(files, workers=4, depth=3, stats=stats):
+        raw, st = fetch()
+        assert raw == open(file, 'rb').read()
+        assert st.st_size == len(raw)
+        delivered.append(file)
+
+    assert delivered == files
+    assert stats.files == 12
+    assert stats.bytes == sum(os.path.getsize(f) for f in files)
+
+
+def test_read_errors_surface_in_fetch(tmp_path):
+    files = write_files(tmp_path, 3)
+    files.insert(1, str(tmp_path / 'missing.xml'))
+
+    results = []
+    for file, fetch in ReadAhead(files, workers=2, depth=2):
+        try:
+            results.append(len(fetch()[0]))
+        except FileNotFoundError:
+            results.append(None)
+
+    assert results == [21, None, 22, 23]
+
+
+def test_closing_early_cancels_queued_reads(tmp_path, monkeypatch):
+    files = write_files(tmp_path, 10)
+    read_bytes = xml_reader._read_bytes
+    read = []
+
+    def slow_read(file):
+        read.append(file)
+        time.sleep(0.2)
+        return read_bytes(file)
+
+    monkeypatch.setattr(xml_reader, '_read_bytes', slow_read)
+    reader = iter(ReadAhead(files, workers=1, depth=2))
+    file, fetch = next(reader)
+    fetch()
+    reader.close()
+
+    # The read in flight finishes, the queued one is cancelled
+    assert read == files[:2]
+
+
+def test_failed_files_count_towards_parse_and_process_time():
+    stats = ReadStats()
+    stats.add_times(10.0, None, 10.5)    # failed while parsing
+    stats.add_times(20.0, 20.25, 21.0)   # failed (or succeeded) while processing
+    stats.add_times(None, None, 30.0)    # failed while reading
+    assert stats.parse_time == pytest.approx(0.75)
+    assert stats.process_time == pytest.approx(0.75)